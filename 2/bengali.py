@@ -1,109 +1,234 @@
 import os
+import sys
 import glob
 import json
-from bltk.langtools import Tokenizer, remove_stopwords
-from bangla_stemmer.stemmer import stemmer
 from collections import defaultdict
 
-tokenizer = Tokenizer()
-stemmer = stemmer.BanglaStemmer()
-
-bengali_folder_path = os.path.join(os.getcwd(), "data/bengali")
-file_paths = [
-    f
-    for f in glob.glob(os.path.join(bengali_folder_path, "**"), recursive=True)
-    if os.path.isfile(f)
-]
-file_paths = file_paths[1:10000]
-bengali_documents = []
-for file_path in file_paths:
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.analyzer import BengaliAnalyzer
+from common.dedup import deduplicate
+from common.index import InvertedIndex, LazyIndex, write_lazy_index
+from common.kgram import KGramIndex, write_kgram_index
+from common.sharding import SHARD_COUNT, ShardWorkers, build_shards
+
+analyzer = BengaliAnalyzer()
+
+# The index is split into shards of documents, each read lazily by its worker, and a lexicon with the
+# statistics of every term over all the shards. The terms of the lexicon also have a k-gram index, for
+# wildcard queries and spelling corrections. Only one document of every group of near duplicates is
+# indexed, and the documents file has the paths of every doc id and of its near duplicates
+INDEX_PATH = "data/ben_shards"
+
+
+def get_file_paths():
+    bengali_folder_path = os.path.join(os.getcwd(), "data/bengali")
+    return [
+        f
+        for f in glob.glob(os.path.join(bengali_folder_path, "**"), recursive=True)
+        if os.path.isfile(f)
+    ]
+
+
+def read_document(file_path):
     with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
-        bengali_documents.append(file.read())
-document_count = len(bengali_documents)
+        return file.read()
 
 
 def preprocess_document(document):
-    tokens = tokenizer.word_tokenizer(document)
-    tokens = remove_stopwords(tokens)
-    tokens = [stemmer.stem(token) for token in tokens]
-    return tokens
+    return analyzer.analyze(document)
 
 
-def create_index(documents):
-    index = defaultdict(
-        lambda: {"term_frequency": 0, "document_frequency": 0, "posting_list": {}}
-    )
+# Indexes the documents, numbering them from start
+def create_index(documents, start=0):
+    index = InvertedIndex()
 
-    for doc_id, document in enumerate(documents):
-        unique_terms = set(document)
+    for doc_id, document in enumerate(documents, start):
+        term_frequency = defaultdict(int)
+        for term in document:
+            term_frequency[term] += 1
 
-        for term in unique_terms:
-            index[term]["term_frequency"] += document.count(term)
-            index[term]["document_frequency"] += 1
-            index[term]["posting_list"][doc_id] = document.count(term)
+        for term, frequency in term_frequency.items():
+            index.add_posting(term, doc_id, frequency)
 
     return index
 
 
-def boolean_retrieval(query, index):
-    query_terms = preprocess_document(query)
-    result_docs = set(range(document_count))
+# Runs in a worker process: indexes one shard of the documents, writes it and returns its term statistics
+def build_shard(shard_id, start, documents):
+    preprocessed_documents = [preprocess_document(doc) for doc in documents]
+    index = create_index(preprocessed_documents, start)
+    write_lazy_index(os.path.join(INDEX_PATH, f"shard_{shard_id}"), index)
+
+    return {
+        term: [posting_list.term_frequency, posting_list.document_frequency]
+        for term, posting_list in index.items()
+    }
+
+
+# Builds the shards in parallel and merges their term statistics into the lexicon
+def build_sharded_index(documents):
+    os.makedirs(INDEX_PATH, exist_ok=True)
 
+    lexicon = defaultdict(lambda: {"term_frequency": 0, "document_frequency": 0})
+    for shard_terms in build_shards(build_shard, documents):
+        for term, (term_frequency, document_frequency) in shard_terms.items():
+            lexicon[term]["term_frequency"] += term_frequency
+            lexicon[term]["document_frequency"] += document_frequency
+
+    write_index(
+        {
+            "document_count": len(documents),
+            "shard_count": SHARD_COUNT,
+            "terms": lexicon,
+        },
+        "lexicon",
+    )
+
+    # The k-gram index uses the positions of the terms in the lexicon as their ids
+    write_kgram_index(os.path.join(INDEX_PATH, "kgrams"), list(lexicon))
+
+
+# Indexes the first document of every group of near duplicates, and writes the paths of every group
+# by the doc id of the indexed document
+def build_deduplicated_index(file_paths):
+    documents = [read_document(file_path) for file_path in file_paths]
+    groups = deduplicate(documents)
+
+    build_sharded_index([documents[group[0]] for group in groups])
+    write_index([[file_paths[i] for i in group] for group in groups], "documents")
+
+
+# Runs in the shard worker: the documents of the shard that contain a term of every clause
+def intersect_shard(index, clauses):
+    result_docs = None
+    for terms in clauses:
+        doc_ids = set()
+        for term in terms:
+            posting_list = index.get(term)
+            if posting_list is not None:
+                doc_ids.update(posting_list.doc_ids)
+        result_docs = doc_ids if result_docs is None else result_docs & doc_ids
+
+    return result_docs
+
+
+# Splits the query into clauses of terms, one of which a document has to contain for every clause.
+# A word with * wildcards (like retriev*) is a clause of all the terms it matches. A term that is not in
+# any document is replaced by its closest spelling correction (the one in the most documents on a tie),
+# and ignored if there is none
+def parse_query(query, lexicon, kgram_index):
+    terms = lexicon["terms"]
+    words = query.split()
+
+    clauses = []
+    for word in words:
+        if "*" in word:
+            clauses.append(kgram_index.expand_wildcard(word.lower()))
+            print(f"Wildcard: {word} matches {len(clauses[-1])} terms")
+            print()
+
+    query_terms = preprocess_document(
+        " ".join(word for word in words if "*" not in word)
+    )
     for term in query_terms:
-        if term in index:
-            result_docs = result_docs.intersection(
-                set([int(doc_id) for doc_id in index[term]["posting_list"].keys()])
+        if term not in terms:
+            suggestions = kgram_index.suggest(term)
+            if not suggestions:
+                continue
+
+            closest_distance = suggestions[0][0]
+            correction = max(
+                (
+                    suggestion
+                    for distance, suggestion in suggestions
+                    if distance == closest_distance
+                ),
+                key=lambda suggestion: terms[suggestion]["document_frequency"],
             )
+            print(f"Term: {term} not found in any document, searching for {correction}")
+            print()
+            term = correction
+
+        clauses.append([term])
+
+    return clauses
+
+
+# A query without any known term matches every document
+def boolean_retrieval(query, lexicon, workers, kgram_index):
+    clauses = parse_query(query, lexicon, kgram_index)
+    if not clauses:
+        return set(range(lexicon["document_count"]))
+
+    result_docs = set()
+    for shard_docs in workers.scatter(intersect_shard, clauses):
+        result_docs |= shard_docs
 
     return result_docs
 
 
-def write_index(index):
-    with open("data/ben_index", "w") as file:
+def write_index(index, name):
+    with open(os.path.join(INDEX_PATH, name), "w") as file:
         file.write(json.dumps(index))
 
 
-def load_index():
-    with open("data/ben_index", "r") as file:
+def load_index(name):
+    with open(os.path.join(INDEX_PATH, name), "r") as file:
         return json.loads(file.read())
 
 
-index = None
-# Use the index if it exists, otherwise create the index
-if os.path.exists("data/ben_index"):
-    index = load_index()
-else:
-    preprocessed_documents = [preprocess_document(doc) for doc in bengali_documents]
-    index = create_index(preprocessed_documents)
-    write_index(index)
-
-print("Boolean Retrieval System")
-print("Enter 'exit' to quit the program\n")
-
-while True:
-    query = input("Enter your query: ")
-    if query == "exit":
-        break
-
-    for term in query.split():
-        if term in index:
-            print(f"Term: {term}")
-            print(f"Term Frequency: {index[term]['term_frequency']}")
-            print(f"Document Frequency: {index[term]['document_frequency']}")
-            print()
-        else:
-            print(f"Term: {term} not found in any document")
-            print()
+def load_shard(shard_id):
+    return LazyIndex(os.path.join(INDEX_PATH, f"shard_{shard_id}"))
+
 
-    result_documents = list(boolean_retrieval(query, index))
-    print(f"Number of documents retrieved: {len(result_documents)}")
-
-    # Display the matched content of atmax 5 documents
-    for doc_id in result_documents[:5]:
-        lines = bengali_documents[doc_id].split("\n")
-        for line in lines:
-            words = line.split()
-            if len(set(words).intersection(set(query.split()))) != 0:
-                print("Document ID:", doc_id)
-                print(f"Content: ...{line}...\n")
+if __name__ == "__main__":
+    # Use the index if it exists, otherwise create the index. The documents are only read to build the
+    # index, and then one at a time to display them
+    if not os.path.exists(os.path.join(INDEX_PATH, "documents")):
+        build_deduplicated_index(get_file_paths())
+    lexicon = load_index("lexicon")
+    index = lexicon["terms"]
+    documents = load_index("documents")
+    kgram_index = KGramIndex(os.path.join(INDEX_PATH, "kgrams"), list(index))
+
+    print("Boolean Retrieval System")
+    print("Enter 'exit' to quit the program\n")
+
+    with ShardWorkers(load_shard, lexicon["shard_count"]) as workers:
+        while True:
+            query = input("Enter your query: ")
+            if query == "exit":
                 break
+
+            for term in query.split():
+                if "*" in term:
+                    continue
+                if term in index:
+                    print(f"Term: {term}")
+                    print(f"Term Frequency: {index[term]['term_frequency']}")
+                    print(f"Document Frequency: {index[term]['document_frequency']}")
+                    print()
+                else:
+                    print(f"Term: {term} not found in any document")
+                    print()
+
+            result_documents = sorted(
+                boolean_retrieval(query, lexicon, workers, kgram_index)
+            )
+            print(f"Number of documents retrieved: {len(result_documents)}")
+
+            # Display the matched content of atmax 5 documents, by their path (the doc ids of the index
+            # depend on the deduplication)
+            for doc_id in result_documents[:5]:
+                file_path = documents[doc_id][0]
+                lines = read_document(file_path).split("\n")
+                for line in lines:
+                    words = line.split()
+                    if len(set(words).intersection(set(query.split()))) != 0:
+                        print("Document:", file_path)
+                        print(f"Content: ...{line}...\n")
+                        if len(documents[doc_id]) > 1:
+                            print(
+                                f"Near duplicates: {', '.join(documents[doc_id][1:])}\n"
+                            )
+                        break
@@ -1,140 +1,321 @@
 import os
+import sys
 import glob
 import json
+import heapq
+from functools import partial
+from array import array
 from math import log10
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
 from collections import defaultdict
 
-import nltk
-
-nltk.download("punkt")
-nltk.download("stopwords")
-
-english_folder_path = os.path.join(os.getcwd(), "data/english")
-file_paths = [
-    f
-    for f in glob.glob(os.path.join(english_folder_path, "**"), recursive=True)
-    if os.path.isfile(f)
-]
-
-english_documents = []
-for file_path in file_paths:
-    with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
-        english_documents.append(file.read())
-
-document_count = len(english_documents)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.analyzer import EnglishAnalyzer
+from common.dedup import deduplicate
+from common.index import InvertedIndex, LazyIndex, build_champion_lists
+from common.index import write_lazy_index
+from common.sharding import (
+    SHARD_COUNT,
+    ShardWorkers,
+    build_shards,
+    get_shard_ranges,
+    map_shards,
+)
+
+analyzer = EnglishAnalyzer()
+
+# The index is split into shards of documents, each with a lazily read index and a document norms file,
+# and a lexicon with the document frequency of every term over all the shards. The shards can also have
+# champion lists, the high tier of a tiered index, for each champion list size they were built with.
+# Only one document of every group of near duplicates is indexed, and the documents file has the group of
+# every doc id, as positions in the list of documents
+INDEX_PATH = "data/eng_vsm_shards"
+
+
+def load_documents():
+    english_folder_path = os.path.join(os.getcwd(), "data/english")
+    file_paths = [
+        f
+        for f in glob.glob(os.path.join(english_folder_path, "**"), recursive=True)
+        if os.path.isfile(f)
+    ]
+
+    english_documents = []
+    for file_path in file_paths:
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
+            english_documents.append(file.read())
+
+    return english_documents
 
 
 def preprocess_document(document):
-    tokens = word_tokenize(document.lower())
-
-    stop_words = set(stopwords.words("english"))
-    tokens = [token for token in tokens if token.isalnum() and token not in stop_words]
-
-    porter_stemmer = PorterStemmer()
-    tokens = [porter_stemmer.stem(token) for token in tokens]
+    return analyzer.analyze(document)
 
-    return tokens
 
+# Indexes the documents, numbering them from start
+def create_index(preprocessed_documents, start=0):
+    # Calculate the term frequency of each term in each document
+    index = InvertedIndex()
 
-def create_index(preprocessed_documents):
-    # Calculate the term frequency and document frequency for each term
-    index = defaultdict(lambda: {"document_frequency": 0, "posting_list": {}})
-
-    for doc_id, doc in enumerate(preprocessed_documents):
+    for doc_id, doc in enumerate(preprocessed_documents, start):
         term_frequency = defaultdict(int)
         for term in doc:
             term_frequency[term] += 1
 
         for term, frequency in term_frequency.items():
-            index[term]["document_frequency"] += 1
-            index[term]["posting_list"][str(doc_id)] = frequency
+            index.add_posting(term, doc_id, frequency)
 
     return index
 
 
-def get_weight_vector_document(index, doc_id):
-    weight_vector = {}
-    for term in index:
-        if str(doc_id) in index[term]["posting_list"]:
-            weight_vector[term] = (
-                1 + log10(index[term]["posting_list"][str(doc_id)])
-            ) * log10(document_count / index[term]["document_frequency"])
-        else:
-            weight_vector[term] = 0
+def get_weight(term_frequency, document_frequency, document_count):
+    return (1 + log10(term_frequency)) * log10(document_count / document_frequency)
+
+
+# Runs in a worker process: indexes one shard of the documents, writes it and returns its document frequencies
+def build_shard(shard_id, start, documents):
+    preprocessed_documents = [preprocess_document(doc) for doc in documents]
+    index = create_index(preprocessed_documents, start)
+    write_lazy_index(os.path.join(INDEX_PATH, f"shard_{shard_id}"), index)
+
+    return {
+        term: posting_list.document_frequency for term, posting_list in index.items()
+    }
+
+
+# Runs in a worker process: the length of the weight vector of every document in the shard. The weights
+# depend on the document frequencies over all the shards, so this needs the merged lexicon
+def build_shard_norms(shard_id, document_frequencies, document_count):
+    start, end = get_shard_ranges(document_count, SHARD_COUNT)[shard_id]
+
+    norms = array("d", [0.0]) * (end - start)
+    for term, posting_list in load_shard(shard_id).items():
+        for doc_id, frequency in posting_list:
+            weight = get_weight(frequency, document_frequencies[term], document_count)
+            norms[doc_id - start] += weight**2
+
+    write_index(
+        {"start": start, "norms": [norm**0.5 for norm in norms]}, f"norms_{shard_id}"
+    )
+
+
+# Builds the shards in parallel, merges their document frequencies into the lexicon, and then computes
+# the document norms of the shards in parallel
+def build_sharded_index(documents):
+    os.makedirs(INDEX_PATH, exist_ok=True)
+
+    # Champion lists of an earlier index would have the wrong doc ids
+    for path in glob.glob(os.path.join(INDEX_PATH, "champions_*")):
+        os.remove(path)
+
+    document_frequencies = defaultdict(int)
+    for shard_frequencies in build_shards(build_shard, documents):
+        for term, document_frequency in shard_frequencies.items():
+            document_frequencies[term] += document_frequency
+
+    map_shards(build_shard_norms, SHARD_COUNT, document_frequencies, len(documents))
+    write_index(
+        {
+            "document_count": len(documents),
+            "shard_count": SHARD_COUNT,
+            "document_frequency": document_frequencies,
+        },
+        "lexicon",
+    )
+
+
+# Indexes the first document of every group of near duplicates, and writes the groups by the doc id of
+# the indexed document
+def build_deduplicated_index(documents):
+    groups = deduplicate(documents)
+    build_sharded_index([documents[group[0]] for group in groups])
+    write_index(groups, "documents")
+
+
+# Runs in a worker process: the champion lists of the terms in the shard, with the champion_count
+# documents with the highest weights for each term
+def build_shard_champions(shard_id, champion_count):
+    champion_lists = build_champion_lists(load_shard(shard_id), champion_count)
+    write_lazy_index(get_champions_path(shard_id, champion_count), champion_lists)
+
+
+# Runs in the shard worker: the k documents of the shard with the highest cosine similarity to the query,
+# found by accumulating the scores over the posting lists of the query terms. With use_champions the
+# scores are accumulated over the champion lists of the query terms instead (the high tier), which
+# store the frequencies of their documents, so the full posting lists are never read. A document then
+# only scores for the query terms it is a champion of, which can make its score lower than in a search
+# of all the postings
+def score_shard(shard, query_weights, query_norm, document_count, k, use_champions):
+    index, champion_lists, start, norms = shard
+    if use_champions:
+        index = champion_lists
+
+    scores = defaultdict(float)
+    for term, (query_weight, document_frequency) in query_weights.items():
+        posting_list = index.get(term)
+        if posting_list is None:
+            continue
+        for doc_id, frequency in posting_list:
+            weight = get_weight(frequency, document_frequency, document_count)
+            scores[doc_id] += query_weight * weight
+
+    similarity_scores = [
+        (doc_id, score / (query_norm * norms[doc_id - start]))
+        for doc_id, score in scores.items()
+    ]
+    return heapq.nlargest(k, similarity_scores, key=lambda item: (item[1], -item[0]))
+
+
+# Returns the k (doc_id, similarity score) pairs with the highest scores, best first. The weights use the
+# document frequencies over all the shards, so the scores are the same as with a single index.
+# With tiered, the high tier (the champion lists) is searched first, and all the postings only if that
+# finds fewer than k documents
+def vector_space_model_retrieval(query, lexicon, workers, k=5, tiered=False):
+    document_count = lexicon["document_count"]
+    document_frequencies = lexicon["document_frequency"]
+    query_terms = [
+        term for term in preprocess_document(query) if term in document_frequencies
+    ]
+
+    # Terms that are in every document have no weight, so they do not change any score
+    query_weights = {}
+    for term in dict.fromkeys(query_terms):
+        query_weight = get_weight(
+            query_terms.count(term), document_frequencies[term], document_count
+        )
+        if query_weight > 0:
+            query_weights[term] = (query_weight, document_frequencies[term])
 
-    return weight_vector
+    query_norm = sum(weight**2 for weight, _ in query_weights.values()) ** 0.5
+    if query_norm == 0:
+        return []
 
+    for use_champions in (True, False) if tiered else (False,):
+        shard_results = workers.scatter(
+            score_shard, query_weights, query_norm, document_count, k, use_champions
+        )
+        results = heapq.nlargest(
+            k,
+            [item for shard_result in shard_results for item in shard_result],
+            key=lambda item: (item[1], -item[0]),
+        )
+        if len(results) >= k:
+            break
 
-def get_weight_vector_query(index, query_terms):
-    weight_vector = {}
-    for term in index:
-        if term in query_terms:
-            weight_vector[term] = (1 + log10(query_terms.count(term))) * log10(
-                document_count / index[term]["document_frequency"]
-            )
-        else:
-            weight_vector[term] = 0
+    return results
 
-    return weight_vector
 
+# Runs the numbered queries ("<query_number> <query>" on every line) with and without the champion lists.
+# The tiered results are written as a res file and the exhaustive results as a qrels file, so that the
+# evaluator of lab 4 shows how many of the exhaustive results the champion lists find (the recall).
+# Documents are numbered by their position in the list of documents, from 1. Queries without any result
+# are skipped, as the evaluator has nothing to compare for them
+def evaluate_champions(queries_path, res_path, qrels_path, lexicon, groups, workers, k):
+    with open(queries_path, "r") as file:
+        queries = [line.split(maxsplit=1) for line in file if line.strip()]
 
-def cosine_similarity(v1, v2):
-    dot_product = sum(v1[term] * v2[term] for term in v1)
-    magnitude_v1 = sum(v1[term] ** 2 for term in v1) ** 0.5
-    magnitude_v2 = sum(v2[term] ** 2 for term in v2) ** 0.5
+    with open(res_path, "w") as res, open(qrels_path, "w") as qrels:
+        for query_number, query in queries:
+            results = vector_space_model_retrieval(query, lexicon, workers, k)
+            if not results:
+                print(f"Query {query_number} has no results, skipped")
+                continue
 
-    if (magnitude_v1 * magnitude_v2) == 0:
-        return 0
+            for doc_id, _ in results:
+                qrels.write(f"{query_number} Q0 {groups[doc_id][0] + 1} 1\n")
 
-    return dot_product / (magnitude_v1 * magnitude_v2)
+            results = vector_space_model_retrieval(
+                query, lexicon, workers, k, tiered=True
+            )
+            for rank, (doc_id, score) in enumerate(results):
+                document_number = groups[doc_id][0] + 1
+                res.write(
+                    f"{query_number} Q0 {document_number} {rank} {score} champions\n"
+                )
 
 
-def vector_space_model_retrieval(query, index):
-    query_terms = preprocess_document(query)
-    weight_vector_query = get_weight_vector_query(index, query_terms)
+def write_index(index, name):
+    with open(os.path.join(INDEX_PATH, name), "w") as file:
+        file.write(json.dumps(index))
 
-    similarity_scores = {}
-    for doc_id in range(document_count):
-        weight_vector_document = get_weight_vector_document(index, doc_id)
-        similarity_scores[doc_id] = cosine_similarity(
-            weight_vector_query, weight_vector_document
-        )
 
-    return similarity_scores
+def load_index(name):
+    with open(os.path.join(INDEX_PATH, name), "r") as file:
+        return json.loads(file.read())
 
 
-def write_index(index):
-    with open("data/eng_index_vsm", "w") as file:
-        file.write(json.dumps(index))
+def load_shard(shard_id):
+    return LazyIndex(os.path.join(INDEX_PATH, f"shard_{shard_id}"))
 
 
-def load_index():
-    with open("data/eng_index_vsm", "r") as file:
-        return json.loads(file.read())
+def get_champions_path(shard_id, champion_count):
+    return os.path.join(INDEX_PATH, f"champions_{champion_count}_{shard_id}")
+
+
+def load_shard_tiers(champion_count, shard_id):
+    champion_lists = None
+    if champion_count is not None:
+        champion_lists = LazyIndex(get_champions_path(shard_id, champion_count))
 
+    norms = load_index(f"norms_{shard_id}")
+    return (
+        load_shard(shard_id),
+        champion_lists,
+        norms["start"],
+        array("d", norms["norms"]),
+    )
 
-index = None
-# Use the index if it exists, otherwise create the index
-if os.path.exists("data/eng_index_vsm"):
-    index = load_index()
-else:
-    preprocessed_documents = [preprocess_document(doc) for doc in english_documents]
-    index = create_index(preprocessed_documents)
-    write_index(index)
-
-print("Vector Space Model Retrieval System")
-print("Enter 'exit' to quit the program\n")
-
-while True:
-    query = input("Enter your query: ")
-    if query == "exit":
-        break
-
-    # Print the top 5 documents with the highest similarity scores
-    similarity_scores = vector_space_model_retrieval(query, index)
-    top_5_docs = sorted(similarity_scores, key=similarity_scores.get, reverse=True)[:5]
-    for doc_id in top_5_docs:
-        print(f"Document {doc_id + 1} - Similarity Score: {similarity_scores[doc_id]}")
+
+if __name__ == "__main__":
+    evaluate = len(sys.argv) in (6, 7) and sys.argv[1] == "--evaluate"
+    if not evaluate and len(sys.argv) > 2:
+        print("Usage: python main.py [champion_count]")
+        print(
+            "       python main.py --evaluate <queries_file> <res_file> <qrels_file> "
+            "<champion_count> [k]"
+        )
+        sys.exit()
+
+    # The champion lists are only used if their size is given
+    champion_count = None
+    if evaluate:
+        champion_count = int(sys.argv[5])
+    elif len(sys.argv) == 2:
+        champion_count = int(sys.argv[1])
+
+    # Use the index if it exists, otherwise create the index
+    if not os.path.exists(os.path.join(INDEX_PATH, "documents")):
+        build_deduplicated_index(load_documents())
+    lexicon = load_index("lexicon")
+    groups = load_index("documents")
+
+    # A shard's term dictionary is written last, so its champion lists are complete if it exists
+    if champion_count is not None and not all(
+        os.path.exists(get_champions_path(shard_id, champion_count) + ".terms")
+        for shard_id in range(lexicon["shard_count"])
+    ):
+        map_shards(build_shard_champions, lexicon["shard_count"], champion_count)
+
+    with ShardWorkers(
+        partial(load_shard_tiers, champion_count), lexicon["shard_count"]
+    ) as workers:
+        if evaluate:
+            k = int(sys.argv[6]) if len(sys.argv) == 7 else 5
+            evaluate_champions(*sys.argv[2:5], lexicon, groups, workers, k)
+            sys.exit()
+
+        print("Vector Space Model Retrieval System")
+        print("Enter 'exit' to quit the program\n")
+
+        while True:
+            query = input("Enter your query: ")
+            if query == "exit":
+                break
+
+            # Print the top 5 documents with the highest similarity scores, and their near duplicates
+            for doc_id, score in vector_space_model_retrieval(
+                query, lexicon, workers, tiered=champion_count is not None
+            ):
+                first, *duplicates = [i + 1 for i in groups[doc_id]]
+                print(f"Document {first} - Similarity Score: {score}")
+                if duplicates:
+                    print(f"Near duplicates: {', '.join(map(str, duplicates))}")
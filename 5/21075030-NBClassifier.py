@@ -1,8 +1,13 @@
+import io
 import os
 import sys
+import zlib
+import hashlib
+import tarfile
 import zipfile
 import numpy as np
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 # Delimeters to skip while reading the file
 delimeters_to_skip = [
@@ -21,129 +26,514 @@ delimeters_to_skip = [
 ]
 
 
-class FileReader:
-    def __init__(self, file_path):
-        self.file_path = file_path
-
-    # Reads the file, skip the lines starting with delimeters_to_skip, and return the token frequency
-    def get_token_frequency(self):
-        with open(self.file_path, "r", encoding="utf-8", errors="ignore") as f:
-            lines = f.readlines()
-
-        token_frequency = defaultdict(int)
-        for line in lines:
-            if any([line.startswith(delim) for delim in delimeters_to_skip]):
-                continue
-
-            tokens = line.lower().split()
-            for token in tokens:
-                token_frequency[token] += 1
-
-        return token_frequency
+# Reads documents from a directory, a zip archive or a (compressed) tar archive.
+# Archive members are read straight from the archive, so nothing is ever extracted to disk
+class DocumentReader:
+    def __init__(self, path):
+        self.path = path
+
+    # Yields the path (relative to the source) and the text of every document in the source, or only of
+    # the documents with the given paths (as returned by list_documents)
+    def read_documents(self, document_paths=None):
+        if os.path.isdir(self.path):
+            yield from self.read_directory(document_paths)
+        elif zipfile.is_zipfile(self.path):
+            yield from self.read_zip(document_paths)
+        elif tarfile.is_tarfile(self.path):
+            yield from self.read_tar(document_paths)
+        else:
+            raise ValueError(f"Unsupported document source: {self.path}")
+
+    # Returns the paths of the documents in the source, in the order they are read in, without reading them
+    def list_documents(self):
+        if os.path.isdir(self.path):
+            return self.list_directory()
+        elif zipfile.is_zipfile(self.path):
+            with zipfile.ZipFile(self.path, "r") as zipf:
+                return [m.filename for m in zipf.infolist() if not m.is_dir()]
+        elif tarfile.is_tarfile(self.path):
+            with tarfile.open(self.path, "r:*") as tarf:
+                return [member.name for member in tarf if member.isfile()]
+        else:
+            raise ValueError(f"Unsupported document source: {self.path}")
+
+    def list_directory(self):
+        document_paths = []
+        for dir_path, dir_names, file_names in os.walk(self.path):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                file_path = os.path.join(dir_path, file_name)
+                document_paths.append(os.path.relpath(file_path, self.path))
+        return document_paths
+
+    def read_directory(self, document_paths):
+        if document_paths is None:
+            document_paths = self.list_directory()
+        for document_path in document_paths:
+            file_path = os.path.join(self.path, document_path)
+            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+                yield document_path, f.read()
+
+    def read_zip(self, document_paths):
+        with zipfile.ZipFile(self.path, "r") as zipf:
+            if document_paths is None:
+                document_paths = [m.filename for m in zipf.infolist() if not m.is_dir()]
+            for document_path in document_paths:
+                yield document_path, decode_document(zipf.read(document_path))
+
+    # "r:*" lets tarfile detect the compression, members are read one by one in archive order.
+    # A compressed archive can only be read from the start, so the members that are not wanted are skipped
+    def read_tar(self, document_paths):
+        selected = None if document_paths is None else set(document_paths)
+        with tarfile.open(self.path, "r:*") as tarf:
+            for member in tarf:
+                if member.isfile() and (selected is None or member.name in selected):
+                    yield member.name, decode_document(tarf.extractfile(member).read())
 
 
 class NaiveBayesClass:
-    def __init__(self, class_name, class_path):
+    def __init__(self, class_name):
         self.class_name = class_name
-        self.class_files = self.get_class_files(class_path)
-        self.doc_count = len(self.class_files)
-
-    def get_class_files(self, class_path):
-        class_files = []
-        for file_name in os.listdir(class_path):
-            file_path = os.path.join(class_path, file_name)
-            class_files.append(FileReader(file_path))
-        return class_files
-
-    def get_vocabulary(self):
-        vocabulary = set()
-        for file in self.class_files:
-            vocabulary.update(file.get_token_frequency().keys())
-        return vocabulary
-
-    def train(self, vocabulary, total_doc_count):
-        self.prior = self.doc_count / total_doc_count
-        vocab_size = len(vocabulary)
-        self.conditional_prob = defaultdict(lambda: 1 / vocab_size)
-
-        file_token_frequencies = [
-            file.get_token_frequency() for file in self.class_files
-        ]
-
-        total_token_count = {}
-        total_count = vocab_size
-        for token in vocabulary:
-            total_token_count[token] = sum(
-                [tf[token] for tf in file_token_frequencies if token in tf]
+        self.doc_count = 0
+        self.token_frequency = defaultdict(int)
+
+    # Adds the token counts of a shard of the class files to the class totals
+    def merge_token_frequency(self, token_frequency):
+        for token, frequency in token_frequency.items():
+            self.token_frequency[token] += frequency
+
+
+# Compact, array-backed form of a classifier that can be updated with new documents and saved to disk.
+# The counts are the source of truth, the log probabilities are derived from them lazily.
+# With a bucket_count the model works on hashed features instead of an exact vocabulary: the rows of the
+# matrices are hash buckets, the token frequencies it is given are keyed by bucket (see get_token_frequency)
+# and the memory used no longer depends on the size of the corpus
+class NaiveBayesModel:
+    def __init__(
+        self,
+        class_names,
+        vocabulary,
+        doc_counts,
+        class_token_totals,
+        token_counts,
+        log_likelihood,
+        fingerprint,
+        bucket_count=None,
+    ):
+        self.bucket_count = bucket_count
+        self.class_names = class_names
+        self.class_ids = {name: class_id for class_id, name in enumerate(class_names)}
+        self.vocabulary = vocabulary
+        self.term_ids = {term: term_id for term_id, term in enumerate(vocabulary)}
+        # doc_counts and class_token_totals have one entry per class,
+        # token_counts and log_likelihood have one row per term and one column per class
+        self.doc_counts = doc_counts
+        self.class_token_totals = class_token_totals
+        self.token_counts = token_counts
+        self.log_likelihood = log_likelihood
+        self.log_prior = np.log(doc_counts / max(doc_counts.sum(), 1))
+        self.unknown_log_prob = np.log(1 / max(self.get_vocab_size(), 1))
+        self.fingerprint = fingerprint
+        # Ids of the classes whose log likelihood column does not reflect their counts yet
+        self.stale_classes = set()
+
+    @classmethod
+    def empty(cls, fingerprint=None, bucket_count=None):
+        return cls(
+            [],
+            [],
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0, dtype=np.int64),
+            np.zeros((0, 0), dtype=np.int64),
+            np.zeros((0, 0)),
+            fingerprint,
+            bucket_count,
+        )
+
+    # The number of rows in use, which is fixed when the features are hashed
+    def get_vocab_size(self):
+        return self.bucket_count or len(self.vocabulary)
+
+    # Returns the row of every token (or bucket) in the token frequency, or None for unknown tokens
+    def get_term_ids(self, token_frequency):
+        if self.bucket_count:
+            return list(token_frequency.keys())
+        return [self.term_ids.get(token) for token in token_frequency]
+
+    # Adds the document and token counts of the given NaiveBayesClass objects to the model.
+    # Unseen classes and terms are appended, so a full retrain gives the same probabilities
+    def partial_fit(self, classes):
+        new_class_names = []
+        for nb_class in classes:
+            if nb_class.class_name not in self.class_ids:
+                self.class_ids[nb_class.class_name] = len(self.class_names)
+                self.class_names.append(nb_class.class_name)
+                new_class_names.append(nb_class.class_name)
+
+        new_terms = set()
+        if not self.bucket_count:
+            for nb_class in classes:
+                new_terms.update(nb_class.token_frequency.keys() - self.term_ids.keys())
+        for term in sorted(new_terms):
+            self.term_ids[term] = len(self.vocabulary)
+            self.vocabulary.append(term)
+
+        self.resize(self.get_vocab_size(), len(self.class_names))
+        for nb_class in classes:
+            class_id = self.class_ids[nb_class.class_name]
+            term_ids = self.get_term_ids(nb_class.token_frequency)
+            # A typed array, as an empty list would be float64 and could not be added to the counts
+            self.token_counts[term_ids, class_id] += np.fromiter(
+                nb_class.token_frequency.values(),
+                dtype=np.int64,
+                count=len(nb_class.token_frequency),
+            )
+            self.class_token_totals[class_id] += sum(nb_class.token_frequency.values())
+            self.doc_counts[class_id] += nb_class.doc_count
+            self.stale_classes.add(class_id)
+
+        # The vocabulary size is part of every smoothing denominator
+        if new_terms:
+            self.stale_classes.update(range(len(self.class_names)))
+
+    # Makes room for the given number of terms and classes. Rows are over-allocated so that adding a few
+    # documents at a time does not copy the whole matrices each time. This also turns memory mapped arrays
+    # into in-memory copies that can be written to
+    def resize(self, term_count, class_count):
+        row_count, column_count = self.token_counts.shape
+        if (
+            term_count <= row_count
+            and class_count == column_count
+            and self.token_counts.flags.writeable
+            and self.log_likelihood.flags.writeable
+        ):
+            return
+
+        if term_count > row_count:
+            row_count = max(term_count, 2 * row_count)
+        shape = (row_count, class_count)
+
+        token_counts = np.zeros(shape, dtype=np.int64)
+        token_counts[: len(self.token_counts), :column_count] = self.token_counts
+        self.token_counts = token_counts
+
+        log_likelihood = np.zeros(shape)
+        log_likelihood[: len(self.log_likelihood), :column_count] = self.log_likelihood
+        self.log_likelihood = log_likelihood
+
+        new_class_count = class_count - column_count
+        self.doc_counts = np.append(
+            self.doc_counts, np.zeros(new_class_count, np.int64)
+        )
+        self.class_token_totals = np.append(
+            self.class_token_totals, np.zeros(new_class_count, np.int64)
+        )
+
+    # Recomputes the log probabilities of the classes that changed since they were last computed
+    def update_probabilities(self):
+        if not self.stale_classes:
+            return
+
+        vocab_size = self.get_vocab_size()
+        for class_id in sorted(self.stale_classes):
+            total_count = vocab_size + self.class_token_totals[class_id]
+            self.log_likelihood[:vocab_size, class_id] = np.log(
+                (self.token_counts[:vocab_size, class_id] + 1) / total_count
             )
-            total_count += total_token_count[token]
 
-        for token in vocabulary:
-            self.conditional_prob[token] = (total_token_count[token] + 1) / (
-                total_count
+        self.log_prior = np.log(self.doc_counts / self.doc_counts.sum())
+        self.unknown_log_prob = np.log(1 / vocab_size)
+        self.stale_classes.clear()
+
+    @staticmethod
+    def exists(model_path):
+        return all(
+            os.path.exists(model_path + suffix)
+            for suffix in (".npz", ".npy", "_counts.npy")
+        )
+
+    # The count and likelihood matrices are written as plain .npy files so that they can be memory mapped on
+    # load, everything else goes in a small .npz file next to them. Every file is written to a temporary path
+    # first and then moved in place, since the old files may still be memory mapped
+    def save(self, model_path):
+        self.update_probabilities()
+        vocab_size = self.get_vocab_size()
+        save_array(model_path + ".npy", np.save, self.log_likelihood[:vocab_size])
+        save_array(model_path + "_counts.npy", np.save, self.token_counts[:vocab_size])
+        save_array(
+            model_path + ".npz",
+            np.savez,
+            class_names=encode_strings(self.class_names),
+            vocabulary=encode_strings(self.vocabulary),
+            doc_counts=self.doc_counts,
+            class_token_totals=self.class_token_totals,
+            fingerprint=encode_strings([self.fingerprint or ""]),
+            bucket_count=self.bucket_count or 0,
+        )
+
+    @classmethod
+    def load(cls, model_path):
+        with np.load(model_path + ".npz") as data:
+            return cls(
+                decode_strings(data["class_names"]),
+                decode_strings(data["vocabulary"]),
+                data["doc_counts"],
+                data["class_token_totals"],
+                np.load(model_path + "_counts.npy", mmap_mode="r"),
+                np.load(model_path + ".npy", mmap_mode="r"),
+                (decode_strings(data["fingerprint"]) or [None])[0],
+                int(data["bucket_count"]) or None,
             )
 
+    # Returns the name of the class with the highest posterior for the given token frequency
     def predict(self, token_frequency):
-        prob = np.log(self.prior)
-        for token in token_frequency:
-            prob += np.log(self.conditional_prob[token]) * token_frequency[token]
-        return prob
+        self.update_probabilities()
+
+        term_ids = []
+        counts = []
+        unknown_count = 0
+        for term_id, frequency in zip(
+            self.get_term_ids(token_frequency), token_frequency.values()
+        ):
+            if term_id is None:
+                unknown_count += frequency
+            else:
+                term_ids.append(term_id)
+                counts.append(frequency)
+
+        scores = self.log_prior + self.unknown_log_prob * unknown_count
+        if term_ids:
+            scores = scores + np.asarray(counts) @ self.log_likelihood[term_ids]
+
+        return self.class_names[int(np.argmax(scores))]
 
 
 class NaiveBayesClassifier:
-    def __init__(self, root_dir, eval_dir):
+    def __init__(
+        self, root_dir, eval_dir, model_path=None, workers=None, bucket_count=None
+    ):
         self.root_dir = root_dir
         self.eval_dir = eval_dir
-
-        self.classes = self.get_classes()
-        self.class_count = len(self.classes)
+        self.model_path = model_path
+        self.workers = workers or os.cpu_count()
+        self.bucket_count = bucket_count
+        self.model = self.load_or_train()
+
+    # Loads the saved model if the training data has not changed since it was saved, otherwise trains a new one
+    def load_or_train(self):
+        fingerprint = get_training_fingerprint(self.root_dir)
+        if self.model_path is not None and NaiveBayesModel.exists(self.model_path):
+            model = NaiveBayesModel.load(self.model_path)
+            # Without the training data there is nothing to retrain from, so the saved model is used as is
+            if model.bucket_count != self.bucket_count:
+                print("Saved model uses a different feature space, retraining")
+            elif fingerprint is None or model.fingerprint == fingerprint:
+                print(f"Loaded model from {self.model_path}")
+                return model
+
+        model = self.train(fingerprint)
+        if self.model_path is not None:
+            model.save(self.model_path)
+            print(f"Saved model to {self.model_path}")
+        return model
+
+    def train(self, fingerprint):
+        self.classes = self.count_tokens(self.root_dir, self.bucket_count)
         self.total_doc_count = sum([cls.doc_count for cls in self.classes])
-        self.vocabulary = self.get_vocabulary()
-
         print(f"Total documents: {self.total_doc_count}")
-        print(f"Vocabulary size: {len(self.vocabulary)}")
-
-        for index, cls in enumerate(self.classes):
-            print(f"[{index+1}/{self.class_count}] Training class {cls.class_name}")
-            cls.train(self.vocabulary, self.total_doc_count)
 
-    def get_classes(self):
-        classes = []
-        for class_name in os.listdir(self.root_dir):
-            class_path = os.path.join(self.root_dir, class_name)
-            classes.append(NaiveBayesClass(class_name, class_path))
-        return classes
-
-    def get_vocabulary(self):
-        vocabulary = set()
-        for cls in self.classes:
-            vocabulary.update(cls.get_vocabulary())
-        return vocabulary
-
-    def predict_file(self, file_path):
-        file = FileReader(file_path)
-        max_prob = float("-inf")
-        max_class = None
-
-        for cls in self.classes:
-            prob = cls.predict(file.get_token_frequency())
-            if prob > max_prob:
-                max_prob = prob
-                max_class = cls.class_name
-
-        return max_class
+        model = NaiveBayesModel.empty(fingerprint, self.bucket_count)
+        model.partial_fit(self.classes)
+        print(f"Vocabulary size: {model.get_vocab_size()}")
+        return model
+
+    # Adds the labeled documents in documents_path to the model, without retraining it from scratch
+    def partial_fit(self, documents_path):
+        classes = self.count_tokens(documents_path, self.model.bucket_count)
+        self.model.partial_fit(classes)
+        print(f"Added {sum([cls.doc_count for cls in classes])} documents to the model")
+
+        if self.model_path is not None:
+            self.model.save(self.model_path)
+            print(f"Saved model to {self.model_path}")
+
+    # Counts the tokens of the training documents, where the class of a document is the directory that
+    # contains it. Only the paths of the documents are listed here: every worker reads a consecutive part
+    # of them itself and returns the token counts of each class in its part, so there is one result per
+    # worker to merge. With a single worker the documents are counted in-process
+    def count_tokens(self, documents_path, bucket_count):
+        classes = {}
+        document_paths = []
+        for document_path in DocumentReader(documents_path).list_documents():
+            class_name = get_class_name(document_path)
+            if not class_name:
+                continue
 
+            if class_name not in classes:
+                classes[class_name] = NaiveBayesClass(class_name)
+            classes[class_name].doc_count += 1
+            document_paths.append(document_path)
+
+        if self.workers > 1 and len(document_paths) > 1:
+            batch_size = -(-len(document_paths) // self.workers)
+            batches = get_batches(document_paths, batch_size)
+            with ProcessPoolExecutor(len(batches)) as executor:
+                class_frequencies = list(
+                    executor.map(
+                        count_class_tokens,
+                        [documents_path] * len(batches),
+                        batches,
+                        [bucket_count] * len(batches),
+                    )
+                )
+        else:
+            class_frequencies = [
+                count_class_tokens(documents_path, document_paths, bucket_count)
+            ]
+
+        for class_frequency in class_frequencies:
+            for class_name, token_frequency in class_frequency.items():
+                classes[class_name].merge_token_frequency(token_frequency)
+
+        return list(classes.values())
+
+    def predict_document(self, text):
+        return self.model.predict(get_token_frequency(text, self.model.bucket_count))
+
+    # Classifies the evaluation documents, in chunks spread over a process pool, keeping the source order
     def predict(self):
-        predictions = []
-        for file_name in os.listdir(self.eval_dir):
-            file_path = os.path.join(self.eval_dir, file_name)
-            predictions.append((self.predict_file(file_path), file_name))
-        return predictions
+        file_names = []
+        texts = []
+        for document_path, text in DocumentReader(self.eval_dir).read_documents():
+            file_names.append(os.path.basename(document_path))
+            texts.append(text)
+
+        self.model.update_probabilities()
+        if self.workers == 1:
+            return [
+                (self.predict_document(text), name)
+                for text, name in zip(texts, file_names)
+            ]
+
+        chunk_size = max(1, -(-len(texts) // (self.workers * 4)))
+        with ProcessPoolExecutor(
+            self.workers, initializer=init_prediction_worker, initargs=(self.model,)
+        ) as executor:
+            labels = executor.map(predict_documents, get_batches(texts, chunk_size))
+            predictions = [label for chunk in labels for label in chunk]
+
+        return list(zip(predictions, file_names))
+
+
+# Worker functions, these live at module level so that they can be sent to the process pools
+
+# The model used by a prediction worker, set once when the worker starts
+worker_model = None
+
+
+# Reads the given documents of a source and returns the summed token frequency of every class among them
+def count_class_tokens(documents_path, document_paths, bucket_count):
+    class_frequency = defaultdict(lambda: defaultdict(int))
+    for document_path, text in DocumentReader(documents_path).read_documents(
+        document_paths
+    ):
+        token_frequency = class_frequency[get_class_name(document_path)]
+        for token, frequency in get_token_frequency(text, bucket_count).items():
+            token_frequency[token] += frequency
+    return dict(class_frequency)
+
+
+def init_prediction_worker(model):
+    global worker_model
+    worker_model = model
+
+
+def predict_documents(texts):
+    bucket_count = worker_model.bucket_count
+    return [
+        worker_model.predict(get_token_frequency(text, bucket_count)) for text in texts
+    ]
 
 
 # Utitlity functions
 
 
+# Skips the lines starting with delimeters_to_skip, and returns the token frequency of the rest of the document.
+# With a bucket_count every token is hashed straight into its bucket, and the frequencies are keyed by bucket.
+# crc32 is used instead of hash() because it is stable across processes and runs
+def get_token_frequency(text, bucket_count=None):
+    token_frequency = defaultdict(int)
+    for line in text.split("\n"):
+        if any([line.startswith(delim) for delim in delimeters_to_skip]):
+            continue
+
+        tokens = line.lower().split()
+        if bucket_count:
+            for token in tokens:
+                token_frequency[zlib.crc32(token.encode("utf-8")) % bucket_count] += 1
+        else:
+            for token in tokens:
+                token_frequency[token] += 1
+
+    return token_frequency
+
+
+# The class of a training document is the name of the directory that contains it
+def get_class_name(document_path):
+    return os.path.basename(os.path.dirname(document_path))
+
+
+# Decodes an archive member the same way open() reads a file, including the newline translation
+def decode_document(content):
+    return io.TextIOWrapper(
+        io.BytesIO(content), encoding="utf-8", errors="ignore"
+    ).read()
+
+
+# Splits a list into consecutive batches of at most batch_size items
+def get_batches(items, batch_size):
+    return [items[i : i + batch_size] for i in range(0, len(items), batch_size)]
+
+
+# Returns a hash of the relative path, size and modification time of every training file (or of the
+# training archive), or None if the training data is not present
+def get_training_fingerprint(root_dir):
+    if os.path.isfile(root_dir):
+        stat = os.stat(root_dir)
+        return hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+    if not os.path.isdir(root_dir):
+        return None
+
+    digest = hashlib.sha1()
+    for dir_path, dir_names, file_names in os.walk(root_dir):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            file_path = os.path.join(dir_path, file_name)
+            stat = os.stat(file_path)
+            relative_path = os.path.relpath(file_path, root_dir)
+            digest.update(
+                f"{relative_path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode()
+            )
+    return digest.hexdigest()
+
+
+# Writes an array (or arrays) with the given numpy function through a temporary file
+def save_array(file_path, save_function, *args, **kwargs):
+    with open(file_path + ".tmp", "wb") as f:
+        save_function(f, *args, **kwargs)
+    os.replace(file_path + ".tmp", file_path)
+
+
+# Packs a list of whitespace free strings into a byte array, which is much smaller than a numpy string array
+def encode_strings(strings):
+    return np.frombuffer("\n".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def decode_strings(array):
+    text = array.tobytes().decode("utf-8")
+    return text.split("\n") if text else []
+
+
 # Read the files from a folder, batch them into groups of 40, and write the nth batch to a zip file
 def batch_files_and_zip(root_dir, zip_file_path, n):
     files = os.listdir(root_dir)
@@ -163,21 +553,98 @@ def batch_files_and_zip(root_dir, zip_file_path, n):
 
 # batch_files_and_zip("data/test", "data/21075030_test_file.zip", 23)
 
+
+# Holds out every fifth document of each class (so classes with fewer than five documents are only
+# trained on), and prints the accuracy on the held out documents and the
+# size of the model for the exact vocabulary and for each of the given numbers of hash buckets
+def evaluate_bucket_counts(root_dir, bucket_counts):
+    class_documents = defaultdict(list)
+    for document_path, text in DocumentReader(root_dir).read_documents():
+        class_name = get_class_name(document_path)
+        if class_name:
+            class_documents[class_name].append(text)
+
+    for bucket_count in [None] + bucket_counts:
+        classes = []
+        held_out = []
+        for class_name, texts in class_documents.items():
+            cls = NaiveBayesClass(class_name)
+            for index, text in enumerate(texts):
+                token_frequency = get_token_frequency(text, bucket_count)
+                if index % 5 == 4:
+                    held_out.append((class_name, token_frequency))
+                else:
+                    cls.doc_count += 1
+                    cls.merge_token_frequency(token_frequency)
+            classes.append(cls)
+
+        if not held_out:
+            print("Not enough documents to hold any out")
+            return
+
+        model = NaiveBayesModel.empty(bucket_count=bucket_count)
+        model.partial_fit(classes)
+        correct = sum(
+            [model.predict(frequency) == name for name, frequency in held_out]
+        )
+        model_size = model.token_counts.nbytes + model.log_likelihood.nbytes
+        print(
+            f"Buckets: {bucket_count or 'exact'}\t"
+            f"Accuracy: {correct / len(held_out):.4f}\t"
+            f"Model size: {model_size / 2**20:.1f} MiB"
+        )
+
+
 if __name__ == "__main__":
-    # Get the test zip file path and output file path from command line arguments
-    if len(sys.argv) != 3:
-        print("Usage: python main.py <test_zip_file_path> <output_file_path>")
+    # NOTE: We assume that the training data is present in the "data/newsgroups" folder (or archive)
+    # The trained model is saved to "data/nb_model" and reused until the training data changes
+    args = sys.argv[1:]
+
+    # Train a fixed-memory model on hashed features instead of the exact vocabulary, for example with
+    # python main.py --buckets 262144 <test_zip_file_path> <output_file_path>
+    bucket_count = None
+    if len(args) > 1 and args[0] == "--buckets":
+        bucket_count = int(args[1])
+        args = args[2:]
+
+    # Add newly labeled documents (grouped in directories named after their class) to the saved model
+    if len(args) == 2 and args[0] == "--update":
+        classifier = NaiveBayesClassifier(
+            "data/newsgroups", None, "data/nb_model", bucket_count=bucket_count
+        )
+        classifier.partial_fit(args[1])
         sys.exit()
 
-    test_zip_file_path = sys.argv[1]
-    output_file_path = sys.argv[2]
+    # Compare the accuracy and size of the exact model with hashed models, for example with
+    # python main.py --evaluate-buckets 1024 4096 16384 65536 262144 1048576
+    if len(args) > 1 and args[0] == "--evaluate-buckets":
+        evaluate_bucket_counts("data/newsgroups", [int(arg) for arg in args[1:]])
+        sys.exit()
 
-    # Unzip the test file
-    with zipfile.ZipFile(test_zip_file_path, "r") as zipf:
-        zipf.extractall("test")
+    # Get the test archive path and output file path from command line arguments
+    if len(args) not in (2, 3):
+        print(
+            "Usage: python main.py [--buckets <bucket_count>] <test_zip_file_path> <output_file_path> [workers]"
+        )
+        print(
+            "       python main.py [--buckets <bucket_count>] --update <labeled_documents_path>"
+        )
+        print(
+            "       python main.py --evaluate-buckets <bucket_count> [bucket_count ...]"
+        )
+        sys.exit()
 
-    # NOTE: We assume that the training data is present in the "data/newsgroups" folder
-    classifier = NaiveBayesClassifier("data/newsgroups", "test")
+    test_zip_file_path = args[0]
+    output_file_path = args[1]
+    workers = int(args[2]) if len(args) == 3 else None
+
+    classifier = NaiveBayesClassifier(
+        "data/newsgroups",
+        test_zip_file_path,
+        "data/nb_model",
+        workers,
+        bucket_count,
+    )
 
     # Predict the probabilities and the class for each file, and write the output to a file
     predictions = classifier.predict()
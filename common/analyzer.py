@@ -0,0 +1,365 @@
+import os
+import re
+
+# Shared text analysis for the retrieval labs. The analyzers produce exactly the tokens of the original
+# NLTK / BLTK based preprocess_document functions, but without the nltk.download calls and faster.
+# For English the sentences still come from NLTK's Punkt tokenizer with its trained English parameters,
+# which are bundled (see NLTK_DATA_PATH). Only the sentences that are plain words separated by spaces
+# and simple punctuation skip the Treebank word tokenizer, as its rules cannot change them; all the
+# others go through it unchanged. The stem of every distinct token is computed once.
+# verify_analyzer compares the tokens and the times with the original preprocessing on a collection.
+# NLTK's English stopword list, bundled so that no download is needed
+ENGLISH_STOPWORDS = frozenset("""
+    i me my myself we our ours ourselves you you're you've you'll you'd your yours yourself
+    yourselves he him his himself she she's her hers herself it it's its itself they them their
+    theirs themselves what which who whom this that that'll these those am is are was were be
+    been being have has had having do does did doing a an the and but if or because as until
+    while of at by for with about against between into through during before after above below
+    to from up down in out on off over under again further then once here there when where why
+    how all any both each few more most other some such no nor not only own same so than too
+    very s t can will just don don't should should've now d ll m o re ve y ain aren aren't
+    couldn couldn't didn didn't doesn doesn't hadn hadn't hasn hasn't haven haven't isn isn't ma
+    mightn mightn't mustn mustn't needn needn't shan shan't shouldn shouldn't wasn wasn't weren
+    weren't won won't wouldn wouldn't
+    """.split())
+
+# BLTK's "soft" Bengali stopword list (MIT licensed), bundled so that the analyzer does not need BLTK
+BENGALI_STOPWORDS = frozenset(
+    [
+        " সঙ্গে",
+        "অধীন",
+        "অধীনে",
+        "অন্যান্য",
+        "আগে",
+        "আছে",
+        "আপনার",
+        "আপনি",
+        "আবার",
+        "আমরা",
+        "আমাকে",
+        "আমাদের",
+        "আমার",
+        "আমি",
+        "আরও",
+        "ইচ্ছা",
+        "ইত্যাদি",
+        "উচিত",
+        "উপর",
+        "উপরে",
+        "উভয়",
+        "এ",
+        "এই",
+        "একই",
+        "একটা",
+        "একটি",
+        "একবার",
+        "এখানে",
+        "এগুলো",
+        "এটি",
+        "এবং",
+        "এর",
+        "কখন",
+        "কয়েক",
+        "করছেন",
+        "করবে",
+        "করে",
+        "কার",
+        "কারণ",
+        "কি",
+        "কিংবা",
+        "কিছু",
+        "কিন্তু",
+        "কিভাবে",
+        "কী",
+        "কে",
+        "কেন",
+        "কোথায়",
+        "কোন",
+        "কোনো",
+        "খুব",
+        "খুবই",
+        "গুলি",
+        "ছিল",
+        "জন্য",
+        "জন্যে",
+        "টি",
+        "ঠিক",
+        "তা",
+        "তাই",
+        "তাকে",
+        "তাদের",
+        "তাদেরকে",
+        "তার",
+        "তারপর",
+        "তারা",
+        "তাহলে",
+        "তিনি",
+        "তুলনা",
+        "তুলনায়",
+        "থাকার",
+        "থেকে",
+        "দ্বারা",
+        "না",
+        "নিজেই",
+        "নিজেকে",
+        "নিজেদের",
+        "নিজের",
+        "নিয়ে",
+        "নীচের",
+        "নেই",
+        "পরে",
+        "পারেন",
+        "প্রতিটি",
+        "বন্ধ",
+        "বা",
+        "বিরুদ্ধে",
+        "মধ্যে",
+        "মাঝে",
+        "মাধ্যমে",
+        "যতক্ষণ",
+        "যদি",
+        "যাক",
+        "যারা",
+        "যায়",
+        "যে",
+        "যেটা",
+        "যেমন",
+        "শুধু",
+        "সকল",
+        "সঙ্গে",
+        "সব",
+        "সবার",
+        "সময়",
+        "সম্পর্কে",
+        "সর্বাধিক",
+        "সে",
+        "সেই",
+        "সেখানে",
+        "সেটা",
+        "সেটি",
+        "হচ্ছে",
+        "হতে",
+        "হবে",
+        "হয়",
+        "হয়েছে",
+        "হয়",
+    ]
+)
+
+# BLTK splits one of these off the end (or else the start) of every whitespace separated word.
+# The full list, including "-", is removed along with the stopwords
+BENGALI_PUNCTUATION = frozenset(
+    ["।", ",", ";", ":", "?", "!", "'", ".", '"', "-", "[", "]", "{", "}", "(", ")"]
+    + ["–", "—", "―", "~"]
+)
+BENGALI_SPLIT_PUNCTUATION = BENGALI_PUNCTUATION - {"-"}
+
+# The NLTK data the English analyzer needs: the Punkt parameters in tokenizers/punkt_tab/english, as
+# distributed by NLTK (trained by Kiss and Strunk on English news text). The folder is searched after
+# the usual NLTK data folders, so word_tokenize finds the same parameters without a download
+NLTK_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data")
+
+# The plain words that the Treebank contraction rules split in two
+SPLIT_WORDS = {
+    "cannot": ["can", "not"],
+    "gimme": ["gim", "me"],
+    "gonna": ["gon", "na"],
+    "gotta": ["got", "ta"],
+    "lemme": ["lem", "me"],
+    "wanna": ["wan", "na"],
+}
+
+# A sentence of alphanumeric words, each followed by whitespace or one of ,;: and whitespace, with at
+# most one of .?! at the end. The Treebank rules only split off that punctuation, and the contractions
+# above, so its tokens are its words
+PLAIN_SENTENCE = re.compile(r"\s*(?:[^\W_]+[,;:]?\s+)*[^\W_]+[.?!]?\s*")
+PLAIN_WORD = re.compile(r"[^\W_]+")
+
+
+def add_nltk_data_path():
+    import nltk
+
+    if NLTK_DATA_PATH not in nltk.data.path:
+        nltk.data.path.append(NLTK_DATA_PATH)
+
+
+class EnglishAnalyzer:
+    def __init__(self):
+        from nltk.stem import PorterStemmer
+        from nltk.tokenize.punkt import PunktTokenizer
+        from nltk.tokenize.destructive import NLTKWordTokenizer
+
+        add_nltk_data_path()
+        self.sentence_tokenizer = PunktTokenizer("english")
+        self.word_tokenizer = NLTKWordTokenizer()
+        self.stemmer = PorterStemmer()
+        self.stems = {}
+
+    # Returns the alphanumeric tokens of word_tokenize(document.lower()), in order: the sentences of
+    # Punkt, and the words of every sentence either directly (see PLAIN_SENTENCE) or from the Treebank
+    # word tokenizer, as word_tokenize does
+    def tokenize(self, document):
+        tokens = []
+        for sentence in self.sentence_tokenizer.tokenize(document.lower()):
+            if PLAIN_SENTENCE.fullmatch(sentence):
+                for word in PLAIN_WORD.findall(sentence):
+                    tokens.extend(SPLIT_WORDS.get(word, (word,)))
+            else:
+                tokens.extend(
+                    token
+                    for token in self.word_tokenizer.tokenize(sentence)
+                    if token.isalnum()
+                )
+        return tokens
+
+    def stem(self, token):
+        stem = self.stems.get(token)
+        if stem is None:
+            stem = self.stems[token] = self.stemmer.stem(token)
+        return stem
+
+    def analyze(self, document):
+        return [
+            self.stem(token)
+            for token in self.tokenize(document)
+            if token not in ENGLISH_STOPWORDS
+        ]
+
+
+class BengaliAnalyzer:
+    def __init__(self, lowercase=False):
+        from bangla_stemmer.stemmer import stemmer
+
+        self.lowercase = lowercase
+        self.stemmer = stemmer.BanglaStemmer()
+        self.stems = {}
+
+    # Splits on any Unicode whitespace and separates one leading or trailing punctuation mark (including
+    # the danda) from every word, exactly like BLTK's Tokenizer.word_tokenizer
+    def tokenize(self, document):
+        if self.lowercase:
+            document = document.lower()
+
+        tokens = []
+        for word in document.split():
+            if word[-1] in BENGALI_SPLIT_PUNCTUATION:
+                tokens.append(word[:-1])
+                tokens.append(word[-1])
+            elif word[0] in BENGALI_SPLIT_PUNCTUATION:
+                tokens.append(word[1:])
+                tokens.append(word[0])
+            else:
+                tokens.append(word)
+        return tokens
+
+    def stem(self, token):
+        stem = self.stems.get(token)
+        if stem is None:
+            stem = self.stems[token] = self.stemmer.stem(token)
+        return stem
+
+    def analyze(self, document):
+        return [
+            self.stem(token)
+            for token in self.tokenize(document)
+            if token not in BENGALI_STOPWORDS and token not in BENGALI_PUNCTUATION
+        ]
+
+
+# The original preprocessing of the labs, used to check that the analyzers give the same tokens
+
+
+def nltk_preprocess_document(document):
+    from nltk.tokenize import word_tokenize
+    from nltk.corpus import stopwords
+    from nltk.stem import PorterStemmer
+
+    add_nltk_data_path()
+    tokens = word_tokenize(document.lower())
+
+    stop_words = set(stopwords.words("english"))
+    tokens = [token for token in tokens if token.isalnum() and token not in stop_words]
+
+    porter_stemmer = PorterStemmer()
+    tokens = [porter_stemmer.stem(token) for token in tokens]
+
+    return tokens
+
+
+def bltk_preprocess_document(document, lowercase=False):
+    from bltk.langtools import Tokenizer, remove_stopwords
+    from bangla_stemmer.stemmer import stemmer
+
+    if lowercase:
+        document = document.lower()
+
+    tokens = Tokenizer().word_tokenizer(document)
+    tokens = remove_stopwords(tokens)
+    bangla_stemmer = stemmer.BanglaStemmer()
+    tokens = [bangla_stemmer.stem(token) for token in tokens]
+
+    return tokens
+
+
+# Runs the analyzer and the original preprocessing over the documents, and prints how long each took
+# and which documents (if any) got different tokens
+def verify_analyzer(analyzer, reference, documents):
+    from time import perf_counter
+
+    start = perf_counter()
+    analyzed = [analyzer.analyze(document) for document in documents]
+    analyzer_time = perf_counter() - start
+
+    start = perf_counter()
+    expected = [reference(document) for document in documents]
+    reference_time = perf_counter() - start
+
+    mismatches = [
+        doc_id
+        for doc_id, (tokens, reference_tokens) in enumerate(zip(analyzed, expected))
+        if tokens != reference_tokens
+    ]
+
+    print(f"Documents: {len(documents)}")
+    print(f"Analyzer time: {analyzer_time:.2f}s")
+    print(f"Reference time: {reference_time:.2f}s")
+    print(f"Speedup: {reference_time / max(analyzer_time, 1e-9):.1f}x")
+    print(f"Documents with different tokens: {len(mismatches)}")
+    for doc_id in mismatches[:10]:
+        print(f"  Document {doc_id}")
+
+    return mismatches
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import glob
+
+    # Usage: python -m common.analyzer <english|bengali> <folder_path> [max_documents]
+    language = sys.argv[1]
+    folder_path = sys.argv[2]
+    max_documents = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    file_paths = [
+        f
+        for f in glob.glob(os.path.join(folder_path, "**"), recursive=True)
+        if os.path.isfile(f)
+    ][:max_documents]
+
+    documents = []
+    for file_path in file_paths:
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
+            documents.append(file.read())
+
+    if language == "english":
+        verify_analyzer(EnglishAnalyzer(), nltk_preprocess_document, documents)
+    else:
+        # Lab 2 keeps the case of Bengali text and lab 3 lower cases it first
+        for lowercase in [False, True]:
+            print(f"Lower case: {lowercase}")
+            verify_analyzer(
+                BengaliAnalyzer(lowercase),
+                lambda document: bltk_preprocess_document(document, lowercase),
+                documents,
+            )
@@ -0,0 +1,117 @@
+import zlib
+import numpy as np
+
+from common.sharding import build_shards
+
+# Near duplicate detection for the retrieval labs, with MinHash and locality sensitive hashing. Every
+# document is reduced to the set of its shingles (runs of SHINGLE_SIZE words), and its signature is the
+# minimum hash of its shingles under each of SIGNATURE_SIZE hash functions: the fraction of the signature
+# two documents share estimates the Jaccard similarity of their shingles. The signatures are split into
+# BAND_COUNT bands, and only documents that have the same values in a band are compared, so finding the
+# duplicates takes time and memory linear in the number of documents instead of comparing every pair.
+
+SHINGLE_SIZE = 5
+SIGNATURE_SIZE = 128
+BAND_COUNT = 32
+
+# The estimated Jaccard similarity above which two documents are near duplicates. With 32 bands of 4 rows
+# a pair with this similarity lands in the same bucket of some band with a probability of
+# 1 - (1 - 0.8^4)^32, over 99.9999%. Less similar pairs that land together are dropped when their
+# signatures are compared
+SIMILARITY_THRESHOLD = 0.8
+
+# The hash functions are (a * x + b) mod PRIME of the 32 bit CRC x of a shingle. They have to be the same
+# in every worker process, so they come from a fixed seed, and with a and b below 2^32 the products fit
+# in 64 bits
+PRIME = 4294967291
+SEED = 21075030
+HASH_A, HASH_B = np.random.default_rng(SEED).integers(
+    1, PRIME, size=(2, SIGNATURE_SIZE), dtype=np.uint64
+)
+
+# How many shingles are hashed at once, which bounds the memory used for long documents
+HASH_BATCH_SIZE = 4096
+
+
+def get_shingles(document):
+    words = document.lower().split()
+    return {
+        " ".join(words[i : i + SHINGLE_SIZE])
+        for i in range(max(1, len(words) - SHINGLE_SIZE + 1))
+    }
+
+
+def get_signature(document):
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) for shingle in get_shingles(document)),
+        dtype=np.uint64,
+    )
+
+    signature = np.full(SIGNATURE_SIZE, PRIME, dtype=np.uint64)
+    for i in range(0, len(hashes), HASH_BATCH_SIZE):
+        batch = hashes[i : i + HASH_BATCH_SIZE, np.newaxis]
+        np.minimum(
+            signature, ((batch * HASH_A + HASH_B) % PRIME).min(axis=0), out=signature
+        )
+
+    return signature.astype(np.uint32)
+
+
+# Runs in a worker process: the signatures of a range of the documents
+def get_shard_signatures(shard_id, start, documents):
+    signatures = np.empty((len(documents), SIGNATURE_SIZE), dtype=np.uint32)
+    for i, document in enumerate(documents):
+        signatures[i] = get_signature(document)
+    return signatures
+
+
+# Groups the near duplicates among the documents. Returns the groups as lists of document positions in
+# increasing order, sorted by their first document, which is the one to index
+def deduplicate(documents):
+    if not documents:
+        return []
+    signatures = np.concatenate(build_shards(get_shard_signatures, documents))
+
+    # Union find over the documents, where the root of a group is always its first document
+    parents = list(range(len(documents)))
+
+    def find(doc_id):
+        while parents[doc_id] != doc_id:
+            parents[doc_id] = parents[parents[doc_id]]
+            doc_id = parents[doc_id]
+        return doc_id
+
+    rows = SIGNATURE_SIZE // BAND_COUNT
+    for band in range(BAND_COUNT):
+        keys = np.ascontiguousarray(signatures[:, band * rows : (band + 1) * rows])
+        _, buckets = np.unique(
+            keys.view(np.dtype((np.void, keys.itemsize * rows))).ravel(),
+            return_inverse=True,
+        )
+
+        # Only the documents that share their bucket with another one can be duplicates
+        candidates = np.flatnonzero(np.bincount(buckets)[buckets] > 1)
+        candidates = candidates[np.argsort(buckets[candidates], kind="stable")]
+        bucket_starts = np.flatnonzero(np.diff(buckets[candidates])) + 1
+
+        # Every document of a bucket is compared with the first document of each group seen in it
+        for bucket in np.split(candidates, bucket_starts):
+            firsts = []
+            for doc_id in bucket:
+                for first in firsts:
+                    root, other_root = find(doc_id), find(first)
+                    if root == other_root:
+                        break
+                    similarity = np.count_nonzero(
+                        signatures[doc_id] == signatures[first]
+                    )
+                    if similarity >= SIMILARITY_THRESHOLD * SIGNATURE_SIZE:
+                        parents[max(root, other_root)] = min(root, other_root)
+                        break
+                else:
+                    firsts.append(doc_id)
+
+    groups = {}
+    for doc_id in range(len(documents)):
+        groups.setdefault(find(doc_id), []).append(doc_id)
+    return list(groups.values())
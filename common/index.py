@@ -0,0 +1,207 @@
+import json
+import heapq
+from array import array
+from collections import OrderedDict
+
+# Compact inverted indexes for the retrieval labs. In memory every term is interned to an integer id and
+# its postings are kept in two typed arrays (doc ids and term frequencies) instead of a dictionary.
+# On disk an index is stored as two files: <path>.postings with the arrays of every term one after
+# another, and <path>.terms, the term dictionary, with the document frequency of every term and the
+# offset of its arrays. Opening an index only reads the term dictionary, and the postings of a term are
+# read the first time they are needed.
+
+# How many postings (over all the cached terms) an index keeps in memory
+POSTINGS_CACHE_SIZE = 1_000_000
+
+# The type code of the doc id and term frequency arrays
+POSTING_TYPE = "i"
+
+
+# The postings of a term: the documents it occurs in, in increasing order of doc id, and how many times
+# it occurs in each of them
+class PostingList:
+    __slots__ = ("doc_ids", "frequencies")
+
+    def __init__(self, doc_ids=None, frequencies=None):
+        self.doc_ids = array(POSTING_TYPE) if doc_ids is None else doc_ids
+        self.frequencies = array(POSTING_TYPE) if frequencies is None else frequencies
+
+    def add(self, doc_id, frequency):
+        self.doc_ids.append(doc_id)
+        self.frequencies.append(frequency)
+
+    # Only needed when an index is built, so lists read from disk are not summed
+    @property
+    def term_frequency(self):
+        return sum(self.frequencies)
+
+    @property
+    def document_frequency(self):
+        return len(self.doc_ids)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    # Iterates over the (doc_id, frequency) pairs
+    def __iter__(self):
+        return zip(self.doc_ids, self.frequencies)
+
+    def to_bytes(self):
+        return self.doc_ids.tobytes() + self.frequencies.tobytes()
+
+    @staticmethod
+    def from_bytes(data, document_frequency):
+        doc_ids = array(POSTING_TYPE)
+        frequencies = array(POSTING_TYPE)
+        split = document_frequency * doc_ids.itemsize
+        doc_ids.frombytes(data[:split])
+        frequencies.frombytes(data[split:])
+        return PostingList(doc_ids, frequencies)
+
+
+# An index being built in memory. Terms are interned to ids in the order they are first seen, and the
+# posting list of term id i is posting_lists[i]
+class InvertedIndex:
+    __slots__ = ("term_ids", "terms", "posting_lists")
+
+    def __init__(self):
+        self.term_ids = {}
+        self.terms = []
+        self.posting_lists = []
+
+    def get_term_id(self, term):
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = self.term_ids[term] = len(self.terms)
+            self.terms.append(term)
+            self.posting_lists.append(PostingList())
+        return term_id
+
+    # The documents have to be added in increasing order of doc id
+    def add_posting(self, term, doc_id, frequency):
+        self.posting_lists[self.get_term_id(term)].add(doc_id, frequency)
+
+    def __contains__(self, term):
+        return term in self.term_ids
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def __getitem__(self, term):
+        return self.posting_lists[self.term_ids[term]]
+
+    def get(self, term, default=None):
+        term_id = self.term_ids.get(term)
+        return default if term_id is None else self.posting_lists[term_id]
+
+    def items(self):
+        return zip(self.terms, self.posting_lists)
+
+
+# The champion lists of an index: the champion_count postings of every term with the highest term
+# frequencies (and so the highest weights), ties going to the lower doc id
+def build_champion_lists(index, champion_count):
+    champion_lists = InvertedIndex()
+    for term, posting_list in index.items():
+        champions = heapq.nlargest(
+            champion_count, posting_list, key=lambda posting: (posting[1], -posting[0])
+        )
+        for doc_id, frequency in sorted(champions):
+            champion_lists.add_posting(term, doc_id, frequency)
+
+    return champion_lists
+
+
+# Writes an index (anything with items() of terms and their posting lists) to path
+def write_lazy_index(path, index):
+    terms = []
+    document_frequencies = []
+    offsets = []
+
+    with open(path + ".postings", "wb") as file:
+        for term, posting_list in index.items():
+            terms.append(term)
+            document_frequencies.append(posting_list.document_frequency)
+            offsets.append(file.tell())
+            file.write(posting_list.to_bytes())
+
+    with open(path + ".terms", "w") as file:
+        file.write(
+            json.dumps(
+                {
+                    "terms": terms,
+                    "document_frequencies": document_frequencies,
+                    "offsets": offsets,
+                }
+            )
+        )
+
+
+# Read access to an index written by write_lazy_index, with the same interface as InvertedIndex.
+# The posting lists of the most recently used terms stay cached, up to cache_size postings
+class LazyIndex:
+    def __init__(self, path, cache_size=POSTINGS_CACHE_SIZE):
+        with open(path + ".terms", "r") as file:
+            dictionary = json.loads(file.read())
+        self.terms = dictionary["terms"]
+        self.term_ids = {term: term_id for term_id, term in enumerate(self.terms)}
+        self.document_frequencies = array("q", dictionary["document_frequencies"])
+        self.offsets = array("q", dictionary["offsets"])
+        self.postings_file = open(path + ".postings", "rb")
+
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cached_postings = 0
+
+    def __contains__(self, term):
+        return term in self.term_ids
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def get_document_frequency(self, term):
+        return self.document_frequencies[self.term_ids[term]]
+
+    def __getitem__(self, term):
+        term_id = self.term_ids[term]
+        posting_list = self.cache.get(term_id)
+        if posting_list is not None:
+            self.cache.move_to_end(term_id)
+            return posting_list
+
+        posting_list = self.read_posting_list(self.postings_file, term_id)
+
+        # Evict the least recently used posting lists, but always keep the new one
+        self.cache[term_id] = posting_list
+        self.cached_postings += len(posting_list)
+        while self.cached_postings > self.cache_size and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            self.cached_postings -= len(evicted)
+
+        return posting_list
+
+    def get(self, term, default=None):
+        if term not in self.term_ids:
+            return default
+        return self[term]
+
+    def read_posting_list(self, file, term_id):
+        document_frequency = self.document_frequencies[term_id]
+        file.seek(self.offsets[term_id])
+        data = file.read(2 * document_frequency * array(POSTING_TYPE).itemsize)
+        return PostingList.from_bytes(data, document_frequency)
+
+    # Reads all the posting lists in order, without caching them
+    def items(self):
+        with open(self.postings_file.name, "rb") as file:
+            for term_id, term in enumerate(self.terms):
+                yield term, self.read_posting_list(file, term_id)
+
+    def close(self):
+        self.postings_file.close()
@@ -0,0 +1,180 @@
+import re
+import json
+import numpy as np
+from array import array
+from collections import defaultdict
+
+# k-gram index over the terms of a lexicon, for wildcard queries and spelling corrections. Every term is
+# padded with "$" at both ends and split into its overlapping k-grams, and every k-gram maps to the ids
+# (positions in the list of terms) of the terms that contain it, in increasing order.
+# On disk it is stored as <path>.ids with the term id arrays of every k-gram one after another, and
+# <path>.grams with the number of terms and the offset of the array of every k-gram. Only the latter is
+# read when the index is opened.
+
+# Bigrams, as an edit changes at most k of the k-grams of a word: the fewer that is, the more k-grams a
+# correction has to share with the word, and the fewer terms have to be compared with it
+K = 2
+
+# The number of edits allowed in a correction, by the length of the word (more for longer words)
+MAX_DISTANCES = [0, 0, 0, 1, 1, 1]
+LONG_WORD_MAX_DISTANCE = 2
+
+
+def get_kgrams(term, k=K):
+    padded = f"${term}$"
+    return {padded[i : i + k] for i in range(len(padded) - k + 1)}
+
+
+def get_max_distance(word):
+    if len(word) < len(MAX_DISTANCES):
+        return MAX_DISTANCES[len(word)]
+    return LONG_WORD_MAX_DISTANCE
+
+
+def write_kgram_index(path, terms, k=K):
+    term_ids = defaultdict(lambda: array("i"))
+    for term_id, term in enumerate(terms):
+        for gram in get_kgrams(term, k):
+            term_ids[gram].append(term_id)
+
+    grams = {}
+    with open(path + ".ids", "wb") as file:
+        for gram, ids in term_ids.items():
+            grams[gram] = [len(ids), file.tell()]
+            file.write(ids.tobytes())
+
+    with open(path + ".grams", "w") as file:
+        file.write(json.dumps({"k": k, "grams": grams}))
+
+
+# Levenshtein distance between two words, with the bit-parallel algorithm of Myers (in Hyyrö's form):
+# a column of the distance matrix is kept as the bits of its vertical differences, and every character of
+# other updates the whole column with a few integer operations
+def get_edit_distance(word, other):
+    if not word:
+        return len(other)
+
+    masks = {}
+    for i, character in enumerate(word):
+        masks[character] = masks.get(character, 0) | (1 << i)
+
+    all_ones = (1 << len(word)) - 1
+    last_bit = 1 << (len(word) - 1)
+    positive, negative = all_ones, 0
+    distance = len(word)
+    for character in other:
+        mask = masks.get(character, 0)
+        vertical = mask | negative
+        horizontal = (((mask & positive) + positive) ^ positive) | mask
+        horizontal_positive = negative | (~(horizontal | positive) & all_ones)
+        horizontal_negative = positive & horizontal
+        if horizontal_positive & last_bit:
+            distance += 1
+        elif horizontal_negative & last_bit:
+            distance -= 1
+        horizontal_positive = ((horizontal_positive << 1) | 1) & all_ones
+        horizontal_negative = (horizontal_negative << 1) & all_ones
+        positive = horizontal_negative | (~(vertical | horizontal_positive) & all_ones)
+        negative = horizontal_positive & vertical
+
+    return distance
+
+
+# Read access to an index written by write_kgram_index. terms has to be the same list of terms, in the
+# same order, that the index was written from
+class KGramIndex:
+    def __init__(self, path, terms):
+        with open(path + ".grams", "r") as file:
+            dictionary = json.loads(file.read())
+        self.k = dictionary["k"]
+        self.grams = dictionary["grams"]
+        self.ids_file = open(path + ".ids", "rb")
+        self.terms = terms
+        self.term_lengths = np.fromiter(
+            map(len, terms), dtype=np.int32, count=len(terms)
+        )
+
+    def get_term_ids(self, gram):
+        if gram not in self.grams:
+            return np.zeros(0, dtype=np.int32)
+        count, offset = self.grams[gram]
+        self.ids_file.seek(offset)
+        return np.fromfile(self.ids_file, dtype=np.int32, count=count)
+
+    def get_term_count(self, gram):
+        return self.grams[gram][0] if gram in self.grams else 0
+
+    # The terms that match a pattern with * wildcards (like retriev* or *ing), in the order of the terms.
+    # The terms that have all the k-grams of the pattern are checked against it, as they can have them
+    # in a different order
+    def expand_wildcard(self, pattern):
+        regex = re.compile(".*".join(re.escape(part) for part in pattern.split("*")))
+
+        grams = set()
+        for part in f"${pattern}$".split("*"):
+            grams.update(part[i : i + self.k] for i in range(len(part) - self.k + 1))
+
+        # A pattern with too few characters has no k-grams, so every term has to be checked
+        if not grams:
+            return [term for term in self.terms if regex.fullmatch(term)]
+
+        # Intersect the smallest lists of term ids first, by binary search of the candidates in the others
+        candidates = None
+        for gram in sorted(grams, key=self.get_term_count):
+            term_ids = self.get_term_ids(gram)
+            if candidates is None:
+                candidates = term_ids
+            else:
+                positions = np.searchsorted(term_ids, candidates)
+                positions[positions == len(term_ids)] = 0
+                candidates = candidates[term_ids[positions] == candidates]
+            if len(candidates) == 0:
+                return []
+
+        terms = [self.terms[term_id] for term_id in candidates]
+        return [term for term in terms if regex.fullmatch(term)]
+
+    # The (distance, term) pairs of the terms within max_distance edits of the word (by default, more for
+    # longer words), closest first. An edit changes at most k of the k-grams of a word, so a term within
+    # max_distance edits shares all but k * max_distance of the word's k-grams and all but as many of its
+    # own. Only the terms that pass those bounds and have about the same length are compared with the word
+    def suggest(self, word, max_distance=None):
+        if max_distance is None:
+            max_distance = get_max_distance(word)
+        grams = get_kgrams(word, self.k)
+        min_shared_grams = max(1, len(grams) - self.k * max_distance)
+
+        # A term that shares min_shared_grams of the word's k-grams still shares min_counted_grams of them
+        # when the most common ones are left out. Leaving out up to a third of the required k-grams makes
+        # counting much cheaper, while there are still few candidates to compare
+        min_counted_grams = max(min(min_shared_grams, 3), -(-2 * min_shared_grams // 3))
+        counted_grams = sorted(grams, key=self.get_term_count)
+        counted_grams = counted_grams[
+            : len(grams) - min_shared_grams + min_counted_grams
+        ]
+        shared_grams = np.bincount(
+            np.concatenate([self.get_term_ids(gram) for gram in counted_grams]),
+            minlength=len(self.terms),
+        )
+        candidates = np.flatnonzero(shared_grams >= min_counted_grams)
+        candidates = candidates[
+            np.abs(self.term_lengths[candidates] - len(word)) <= max_distance
+        ]
+
+        suggestions = []
+        for term_id in candidates:
+            term = self.terms[term_id]
+            term_grams = get_kgrams(term, self.k)
+            min_shared = max(len(grams), len(term_grams)) - self.k * max_distance
+            if len(grams & term_grams) < min_shared:
+                continue
+            distance = get_edit_distance(word, term)
+            if distance <= max_distance:
+                suggestions.append((distance, int(term_id)))
+
+        return [
+            (distance, self.terms[term_id]) for distance, term_id in sorted(suggestions)
+        ]
+
+    def close(self):
+        self.ids_file.close()
@@ -0,0 +1,115 @@
+import os
+from multiprocessing import Pipe, Process
+from concurrent.futures import ProcessPoolExecutor
+
+# Document partitioned sharding for the retrieval labs. Every shard indexes a contiguous range of the
+# documents under their global doc ids, the shards are built in parallel, and at query time every shard
+# is held by its own worker process: a query is scattered to all of them and the results are gathered.
+
+SHARD_COUNT = os.cpu_count() or 1
+
+
+# Splits the documents into shard_count contiguous (start, end) ranges of (almost) equal size
+def get_shard_ranges(document_count, shard_count):
+    shard_size, remainder = divmod(document_count, shard_count)
+
+    ranges = []
+    start = 0
+    for shard_id in range(shard_count):
+        end = start + shard_size + (1 if shard_id < remainder else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+# Calls build_shard(shard_id, start, documents) for every shard in its own process, and returns the
+# results in shard order. build_shard has to be a module level function so that it can be pickled
+def build_shards(build_shard, documents, shard_count=SHARD_COUNT):
+    with ProcessPoolExecutor(max_workers=shard_count) as executor:
+        futures = [
+            executor.submit(build_shard, shard_id, start, documents[start:end])
+            for shard_id, (start, end) in enumerate(
+                get_shard_ranges(len(documents), shard_count)
+            )
+        ]
+        return [future.result() for future in futures]
+
+
+# Runs function(shard_id, *args) for every shard in its own process, and returns the results in shard order
+def map_shards(function, shard_count, *args):
+    with ProcessPoolExecutor(max_workers=shard_count) as executor:
+        futures = [
+            executor.submit(function, shard_id, *args)
+            for shard_id in range(shard_count)
+        ]
+        return [future.result() for future in futures]
+
+
+# One long running process per shard. Each process loads its shard once with load_shard(shard_id) and
+# then answers requests until it is closed, so queries do not pay for loading the index again
+class ShardWorkers:
+    def __init__(self, load_shard, shard_count):
+        self.connections = []
+        self.processes = []
+
+        for shard_id in range(shard_count):
+            connection, worker_connection = Pipe()
+            process = Process(
+                target=serve_shard,
+                args=(worker_connection, load_shard, shard_id),
+                daemon=True,
+            )
+            process.start()
+            worker_connection.close()
+
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    # Sends the request to every shard at once, then waits for the results of function(shard, *args)
+    # and returns them in shard order
+    def scatter(self, function, *args):
+        for connection in self.connections:
+            connection.send((function, args))
+
+        results = [connection.recv() for connection in self.connections]
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+        for process in self.processes:
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# The loop of a shard worker process. Errors are sent back to be raised in the main process
+def serve_shard(connection, load_shard, shard_id):
+    try:
+        shard = load_shard(shard_id)
+    except Exception as error:
+        shard = None
+        load_error = error
+
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+
+        function, args = request
+        try:
+            if shard is None:
+                raise load_error
+            result = function(shard, *args)
+        except Exception as error:
+            result = error
+        connection.send(result)
+
+    connection.close()